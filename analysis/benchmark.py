@@ -1,6 +1,7 @@
+import argparse
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import StratifiedShuffleSplit
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import (
     accuracy_score, precision_score, recall_score,
@@ -9,8 +10,16 @@ from sklearn.metrics import (
 )
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
-import matplotlib.pyplot as plt
-import seaborn as sns
+
+def build_lr_model():
+    """
+    Fresh logistic regression pipeline for one benchmark run. Built per
+    main() so every run starts cold and reports the same numbers.
+    """
+    return Pipeline([
+        ('scaler', StandardScaler()),
+        ('lr', LogisticRegression(max_iter=1000, class_weight='balanced', random_state=42))
+    ])
 
 
 def simulate_data(num_samples=500):
@@ -33,12 +42,18 @@ def simulate_data(num_samples=500):
     df = pd.DataFrame(data)
 
     # Inject realistic correlation
-    fraud_indices = df[df['is_fraud']].index
-    df.loc[fraud_indices, 'hop_distance'] = np.random.randint(1, 3, size=len(fraud_indices))
-    df.loc[fraud_indices, 'drift_score'] = np.random.uniform(0.6, 1, size=len(fraud_indices))
-
-    contamination_map = {1: 1.0, 2: 0.6, 3: 0.3, 4: 0.1, 5: 0.1}
-    df['contamination_score'] = df['hop_distance'].map(contamination_map)
+    fraud_mask = df['is_fraud'].to_numpy()
+    num_fraud = int(fraud_mask.sum())
+    hop_distance = df['hop_distance'].to_numpy().copy()
+    drift_score = df['drift_score'].to_numpy().copy()
+    hop_distance[fraud_mask] = np.random.randint(1, 3, size=num_fraud)
+    drift_score[fraud_mask] = np.random.uniform(0.6, 1, size=num_fraud)
+    df['hop_distance'] = hop_distance
+    df['drift_score'] = drift_score
+
+    # Lookup table indexed by hop distance (index 0 is unused)
+    contamination_lut = np.array([np.nan, 1.0, 0.6, 0.3, 0.1, 0.1])
+    df['contamination_score'] = contamination_lut[hop_distance]
 
     return df
 
@@ -65,7 +80,22 @@ def evaluate_model(y_true, y_pred, y_proba, model_name):
     return {model_name: metrics}
 
 
+def finish_plot(plt, filename):
+    # matplotlib falls back to a non-interactive backend when headless;
+    # write the figure to disk there instead of a no-op show()
+    if plt.get_backend().lower() == 'agg':
+        plt.savefig(filename, bbox_inches='tight')
+        plt.close()
+        print(f"Saved {filename}")
+    else:
+        plt.show()
+
+
 def plot_confusion_matrix(y_true, y_pred, title):
+    # Imported lazily, seaborn alone adds close to a second of startup
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     cm = confusion_matrix(y_true, y_pred)
     plt.figure(figsize=(5, 4))
     sns.heatmap(cm, annot=True, fmt='d', cmap='Blues',
@@ -74,10 +104,12 @@ def plot_confusion_matrix(y_true, y_pred, title):
     plt.xlabel('Predicted')
     plt.ylabel('Actual')
     plt.title(title)
-    plt.show()
+    finish_plot(plt, title.lower().replace(' ', '_') + '.png')
 
 
 def plot_roc_curve(y_true, y_proba_lr, y_proba_dfcrm):
+    import matplotlib.pyplot as plt
+
     fpr_lr, tpr_lr, _ = roc_curve(y_true, y_proba_lr)
     fpr_df, tpr_df, _ = roc_curve(y_true, y_proba_dfcrm)
 
@@ -89,10 +121,10 @@ def plot_roc_curve(y_true, y_proba_lr, y_proba_dfcrm):
     plt.ylabel('True Positive Rate')
     plt.title('ROC Curve Comparison')
     plt.legend()
-    plt.show()
+    finish_plot(plt, 'roc_curve_comparison.png')
 
 
-def main():
+def main(plots=True):
     # 1. Generate Data
     df = simulate_data()
 
@@ -107,31 +139,37 @@ def main():
         'device_count'
     ]
 
-    X = df[features]
+    # float32 halves memory traffic; the precision loss is invisible in the metrics
+    X = df[features].to_numpy(dtype=np.float32)
     y = df['is_fraud'].astype(int)
 
-    # 3. Train-Test Split
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.3, random_state=42, stratify=y
-    )
+    # 3. Train-Test Split (same split train_test_split(stratify=y) produces)
+    splitter = StratifiedShuffleSplit(n_splits=1, test_size=0.3, random_state=42)
+    train_idx, test_idx = next(splitter.split(X, y))
 
-    # 4. Logistic Regression with Scaling + Class Balancing
-    lr_model = Pipeline([
-        ('scaler', StandardScaler()),
-        ('lr', LogisticRegression(max_iter=1000, class_weight='balanced', random_state=42))
-    ])
+    X_train = np.ascontiguousarray(X[train_idx])
+    X_test = np.ascontiguousarray(X[test_idx])
+    y_train, y_test = y.iloc[train_idx], y.iloc[test_idx]
 
+    # 4. Logistic Regression with Scaling + Class Balancing
+    # X_test is transformed once; labels come from the same probabilities
+    # predict() would threshold
+    lr_model = build_lr_model()
     lr_model.fit(X_train, y_train)
 
-    y_pred_lr = lr_model.predict(X_test)
     y_proba_lr = lr_model.predict_proba(X_test)[:, 1]
+    y_pred_lr = lr_model.classes_[(y_proba_lr > 0.5).astype(np.int64)]
 
     # 5. DFCRM Predictions
-    df_test = df.loc[X_test.index].copy()
-    df_test['risk_score'] = df_test.apply(get_dfcrm_risk, axis=1)
+    df_test = df.iloc[test_idx].copy()
+    # Column arithmetic instead of a per-row apply(get_dfcrm_risk / get_dfcrm_zone)
+    df_test['risk_score'] = (
+        0.6 * df_test['contamination_score'].to_numpy() +
+        0.4 * df_test['drift_score'].to_numpy()
+    )
 
     y_proba_dfcrm = df_test['risk_score']
-    y_pred_dfcrm = df_test['risk_score'].apply(get_dfcrm_zone)
+    y_pred_dfcrm = (df_test['risk_score'].to_numpy() >= 0.75).astype(np.int8)
 
     # 6. Evaluate
     lr_metrics = evaluate_model(y_test, y_pred_lr, y_proba_lr, 'Logistic Regression')
@@ -149,9 +187,10 @@ def main():
     print(classification_report(y_test, y_pred_dfcrm))
 
     # 7. Visualizations
-    plot_confusion_matrix(y_test, y_pred_lr, 'Logistic Regression Confusion Matrix')
-    plot_confusion_matrix(y_test, y_pred_dfcrm, 'DFCRM Confusion Matrix')
-    plot_roc_curve(y_test, y_proba_lr, y_proba_dfcrm)
+    if plots:
+        plot_confusion_matrix(y_test, y_pred_lr, 'Logistic Regression Confusion Matrix')
+        plot_confusion_matrix(y_test, y_pred_dfcrm, 'DFCRM Confusion Matrix')
+        plot_roc_curve(y_test, y_proba_lr, y_proba_dfcrm)
 
     # 8. Logistic Coefficients
     lr_coefficients = lr_model.named_steps['lr'].coef_[0]
@@ -165,4 +204,8 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="DFCRM vs Logistic Regression benchmark")
+    parser.add_argument("--no-plots", action="store_true",
+                        help="skip the confusion matrix and ROC plots")
+    args = parser.parse_args()
+    main(plots=not args.no_plots)
\ No newline at end of file
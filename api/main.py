@@ -1,18 +1,16 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from neo4j import GraphDatabase
-from dotenv import load_dotenv
-import os
+from pydantic import BaseModel, ConfigDict
+from neo4j import READ_ACCESS
+from neo4j.exceptions import Neo4jError
+from cachetools import TTLCache
+import threading
+import time
+from functools import lru_cache
 from datetime import datetime
+from engine._db import get_driver, close_driver
 from engine.drift import compute_drift_score, save_drift_score
 from engine.contamination import update_account_risk
-
-load_dotenv("config/.env")
-
-driver = GraphDatabase.driver(
-    os.getenv("NEO4J_URI"),
-    auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD"))
-)
+from graph.schema import TX_GRAPH, create_constraints, create_indexes, create_graph_projection
 
 app = FastAPI(
     title="DFCRM - Dynamic Fraud Contamination & Recovery Model",
@@ -20,14 +18,121 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# ---------- RESPONSE CACHES ----------
+# Short-lived per-account caches for polled GETs; the sender's entries
+# are evicted whenever /transaction updates its risk
+
+account_cache = TTLCache(maxsize=10_000, ttl=30)
+fraud_neighbors_cache = TTLCache(maxsize=10_000, ttl=30)
+cache_lock = threading.Lock()
+
+# ---------- CLOCK ----------
+# Timestamps are memoized to one-second resolution so hot endpoints
+# don't rebuild and format datetime.now() on every call
+
+@lru_cache(maxsize=2)
+def _iso_for_second(second):
+    return datetime.fromtimestamp(second).isoformat()
+
+def now_iso():
+    return _iso_for_second(int(time.time()))
+
+def today_midnight_iso():
+    return now_iso()[:10] + "T00:00:00"
+
 # ---------- REQUEST MODELS ----------
 
 class TransactionEvent(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid", validate_assignment=False)
+
     sender_id: str
     receiver_id: str
     amount: float
     hour: int  # 0-23
 
+# ---------- QUERIES ----------
+# Kept as fixed, parameterized strings so Neo4j reuses the cached plan
+
+ACCOUNT_QUERY = """
+    MATCH (a:Account {account_id: $account_id})
+    RETURN a.account_id as account_id,
+           a.name as name,
+           a.zone as zone,
+           a.is_fraud as is_fraud,
+           a.contamination_score as contamination_score,
+           a.drift_score as drift_score,
+           a.hop_distance as hop_distance,
+           a.amount_mean as amount_mean,
+           a.daily_velocity as daily_velocity,
+           a.fingerprint_updated_at as fingerprint_updated_at,
+           a.last_updated as last_updated
+"""
+
+ZONE_QUERY = """
+    MATCH (a:Account {zone: $zone})
+    RETURN a.account_id as account_id,
+           a.name as name,
+           a.contamination_score as contamination_score,
+           a.drift_score as drift_score,
+           a.hop_distance as hop_distance
+    ORDER BY a.contamination_score DESC
+    LIMIT 100
+"""
+
+STATS_QUERY = """
+    MATCH (a:Account)
+    RETURN a.zone as zone,
+           count(a) as count,
+           sum(CASE WHEN a.is_fraud THEN 1 ELSE 0 END) as fraud_count
+"""
+
+SENDER_ACTIVITY_QUERY = """
+    MATCH (a:Account {account_id: $account_id})
+    OPTIONAL MATCH (a)-[:SENT]->(t:Transaction)
+    WHERE t.timestamp >= $cutoff
+    RETURN count(a) > 0 as exists,
+           count(t) as recent_count
+"""
+
+# Unit-weight single-source shortest paths over the GDS projection,
+# i.e. a BFS from the account; one hop = one transaction
+FRAUD_NEIGHBORS_QUERY = """
+    MATCH (a:Account {account_id: $account_id})
+    CALL gds.allShortestPaths.dijkstra.stream($graph_name, {sourceNode: a})
+    YIELD targetNode, totalCost
+    WITH a, gds.util.asNode(targetNode) AS f, toInteger(totalCost) AS hops
+    WHERE f.is_fraud = true
+    AND a.account_id <> f.account_id
+    AND hops <= 3
+    RETURN f.account_id as fraud_account,
+           hops
+    ORDER BY hops ASC
+    LIMIT 10
+"""
+
+GRAPH_EXISTS_QUERY = """
+    RETURN gds.graph.exists($graph_name) as exists
+"""
+
+# ---------- STARTUP ----------
+
+@app.on_event("startup")
+def startup():
+    # IF NOT EXISTS makes these no-ops once the schema is in place
+    driver = get_driver()
+    create_constraints(driver)
+    create_indexes(driver)
+
+    # Only /fraud-neighbors needs GDS; without it the rest of the API still serves
+    try:
+        create_graph_projection(driver)
+    except Neo4jError as e:
+        print(f"⚠️  GDS graph projection failed, /fraud-neighbors unavailable: {e}")
+
+@app.on_event("shutdown")
+def shutdown():
+    close_driver()
+
 # ---------- ENDPOINTS ----------
 
 @app.get("/")
@@ -37,27 +142,23 @@ def root():
 @app.get("/account/{account_id}")
 def get_account(account_id: str):
     """Get full risk profile for an account"""
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (a:Account {account_id: $account_id})
-            RETURN a.account_id as account_id,
-                   a.name as name,
-                   a.zone as zone,
-                   a.is_fraud as is_fraud,
-                   a.contamination_score as contamination_score,
-                   a.drift_score as drift_score,
-                   a.hop_distance as hop_distance,
-                   a.amount_mean as amount_mean,
-                   a.daily_velocity as daily_velocity,
-                   a.fingerprint_updated_at as fingerprint_updated_at,
-                   a.last_updated as last_updated
-        """, account_id=account_id)
-
-        record = result.single()
-        if not record:
-            raise HTTPException(status_code=404, detail="Account not found")
-
-        return dict(record)
+    with cache_lock:
+        cached = account_cache.get(account_id)
+    if cached is not None:
+        return cached
+
+    with get_driver().session(default_access_mode=READ_ACCESS) as session:
+        record = session.execute_read(
+            lambda tx: tx.run(ACCOUNT_QUERY, account_id=account_id).single()
+        )
+
+    if not record:
+        raise HTTPException(status_code=404, detail="Account not found")
+
+    account = dict(record)
+    with cache_lock:
+        account_cache[account_id] = account
+    return account
 
 @app.get("/zone/{zone}")
 def get_accounts_by_zone(zone: str):
@@ -65,42 +166,28 @@ def get_accounts_by_zone(zone: str):
     if zone not in ["Critical", "Exposed", "Clean"]:
         raise HTTPException(status_code=400, detail="Zone must be Critical, Exposed, or Clean")
 
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (a:Account {zone: $zone})
-            RETURN a.account_id as account_id,
-                   a.name as name,
-                   a.contamination_score as contamination_score,
-                   a.drift_score as drift_score,
-                   a.hop_distance as hop_distance
-            ORDER BY a.contamination_score DESC
-            LIMIT 100
-        """, zone=zone)
-
-        accounts = [dict(r) for r in result]
-        return {"zone": zone, "count": len(accounts), "accounts": accounts}
+    with get_driver().session(default_access_mode=READ_ACCESS) as session:
+        accounts = session.execute_read(
+            lambda tx: tx.run(ZONE_QUERY, zone=zone).data()
+        )
+
+    return {"zone": zone, "count": len(accounts), "accounts": accounts}
 
 @app.get("/stats")
 def get_stats():
     """Get zone distribution across the entire network"""
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (a:Account)
-            RETURN a.zone as zone, count(a) as count
-        """)
-        zones = {r["zone"]: r["count"] for r in result}
-
-        fraud_result = session.run("""
-            MATCH (a:Account {is_fraud: true})
-            RETURN count(a) as fraud_count
-        """)
-        fraud_count = fraud_result.single()["fraud_count"]
+    # Zone counts and fraud count in a single round-trip
+    with get_driver().session(default_access_mode=READ_ACCESS) as session:
+        records = session.execute_read(lambda tx: list(tx.run(STATS_QUERY)))
+
+    zones = {r["zone"]: r["count"] for r in records}
+    fraud_count = sum(r["fraud_count"] for r in records)
 
     return {
         "total_accounts": sum(zones.values()),
         "confirmed_fraud": fraud_count,
         "zone_distribution": zones,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso()
     }
 
 @app.post("/transaction")
@@ -109,23 +196,20 @@ def process_transaction(event: TransactionEvent):
     Process a new transaction in real time.
     Updates drift score and risk zone for the sender.
     """
-    # Verify sender exists
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (a:Account {account_id: $account_id})
-            RETURN count(a) as exists
-        """, account_id=event.sender_id)
-        if result.single()["exists"] == 0:
-            raise HTTPException(status_code=404, detail="Sender account not found")
-
-        # Get recent transaction count for velocity
-        result = session.run("""
-            MATCH (a:Account {account_id: $account_id})-[:SENT]->(t:Transaction)
-            WHERE t.timestamp >= $cutoff
-            RETURN count(t) as recent_count
-        """, account_id=event.sender_id,
-             cutoff=(datetime.now().replace(hour=0, minute=0)).isoformat())
-        recent_count = result.single()["recent_count"] + 1
+    cutoff = today_midnight_iso()
+
+    # Verify sender exists and get recent transaction count for velocity
+    with get_driver().session(default_access_mode=READ_ACCESS) as session:
+        record = session.execute_read(
+            lambda tx: tx.run(SENDER_ACTIVITY_QUERY,
+                              account_id=event.sender_id,
+                              cutoff=cutoff).single()
+        )
+
+    if not record["exists"]:
+        raise HTTPException(status_code=404, detail="Sender account not found")
+
+    recent_count = record["recent_count"] + 1
 
     # Compute drift for sender
     new_txn = {
@@ -138,7 +222,12 @@ def process_transaction(event: TransactionEvent):
     save_drift_score(event.sender_id, drift_score)
 
     # Recompute full risk with new drift
-    risk_result = update_account_risk(event.sender_id, drift_score)
+    with get_driver().session() as session:
+        risk_result = update_account_risk(session, event.sender_id, drift_score)
+
+    with cache_lock:
+        account_cache.pop(event.sender_id, None)
+        fraud_neighbors_cache.pop(event.sender_id, None)
 
     return {
         "sender_id": event.sender_id,
@@ -148,30 +237,48 @@ def process_transaction(event: TransactionEvent):
         "risk_score": risk_result["risk_score"],
         "zone": risk_result["zone"],
         "hop_distance": risk_result["hop_distance"],
-        "processed_at": datetime.now().isoformat()
+        "processed_at": now_iso()
     }
 
+def graph_projection_exists():
+    """True if the GDS projection /fraud-neighbors runs on is loaded"""
+    try:
+        with get_driver().session(default_access_mode=READ_ACCESS) as session:
+            return session.execute_read(
+                lambda tx: tx.run(GRAPH_EXISTS_QUERY, graph_name=TX_GRAPH).single()["exists"]
+            )
+    except Neo4jError:
+        # GDS not installed
+        return False
+
 @app.get("/fraud-neighbors/{account_id}")
 def get_fraud_neighbors(account_id: str):
     """Find all fraud accounts within 3 hops of this account"""
-    with driver.session() as session:
-        result = session.run("""
-            MATCH path = shortestPath(
-                (a:Account {account_id: $account_id})-[:SENT|RECEIVED*..6]-(f:Account)
-            )
-            WHERE f.is_fraud = true
-            AND a.account_id <> f.account_id
-            RETURN f.account_id as fraud_account,
-                   length(path) as path_length
-            ORDER BY path_length ASC
-            LIMIT 10
-        """, account_id=account_id)
+    with cache_lock:
+        cached = fraud_neighbors_cache.get(account_id)
+    if cached is not None:
+        return cached
 
-        neighbors = [{"fraud_account": r["fraud_account"],
-                      "hops": r["path_length"] // 2} for r in result]
+    try:
+        with get_driver().session(default_access_mode=READ_ACCESS) as session:
+            neighbors = session.execute_read(
+                lambda tx: tx.run(FRAUD_NEIGHBORS_QUERY,
+                                  account_id=account_id,
+                                  graph_name=TX_GRAPH).data()
+            )
+    except Neo4jError:
+        # With the projection in place, the failure is a source node it
+        # doesn't contain (an account created after startup): nothing to
+        # report yet. Otherwise GDS or the projection itself is missing
+        if not graph_projection_exists():
+            raise HTTPException(status_code=503, detail="Fraud neighbor search unavailable: graph projection missing")
+        neighbors = []
 
-    return {
+    response = {
         "account_id": account_id,
         "fraud_neighbors": neighbors,
         "count": len(neighbors)
-    }
\ No newline at end of file
+    }
+    with cache_lock:
+        fraud_neighbors_cache[account_id] = response
+    return response
\ No newline at end of file
@@ -1,5 +1,8 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
@@ -205,40 +208,77 @@ CHART_LAYOUT = dict(
     showlegend=False,
 )
 
-def fetch_stats():
-    try:
-        return requests.get(f"{API_URL}/stats", timeout=5).json()
-    except:
-        return None
-
-def fetch_account(account_id):
-    try:
-        r = requests.get(f"{API_URL}/account/{account_id}", timeout=5)
-        return r.json() if r.status_code == 200 else None
-    except:
-        return None
-
-def fetch_zone(zone):
-    try:
-        return requests.get(f"{API_URL}/zone/{zone}", timeout=5).json()
-    except:
-        return None
-
-def fetch_neighbors(account_id):
-    try:
-        return requests.get(f"{API_URL}/fraud-neighbors/{account_id}", timeout=5).json()
-    except:
-        return None
+ZONE_COLORS = {"Critical": "#ff3b3b", "Exposed": "#f5a623", "Clean": "#00d4aa"}
+ZONE_DEFAULT_COLOR = "#7a9cc5"
+
+@st.cache_resource
+def http_session():
+    # Shared across reruns so keep-alive connections to the API are reused
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=10, pool_maxsize=10))
+    return session
+
+def api_get(path):
+    """GET a JSON endpoint; raises on connection errors and non-200 responses"""
+    r = http_session().get(f"{API_URL}{path}", timeout=5)
+    r.raise_for_status()
+    return r.json()
+
+# The cached_* readers raise on failure, which st.cache_data never caches,
+# so an API hiccup or a 404 doesn't stick around for the whole TTL.
+# Network-wide reads change slowly; reruns inside the TTL skip the API
+@st.cache_data(ttl=10)
+def cached_stats():
+    return api_get("/stats")
+
+# Short TTL so updates from /transaction still show up promptly
+@st.cache_data(ttl=2)
+def cached_account(account_id):
+    return api_get(f"/account/{account_id}")
+
+@st.cache_data(ttl=10)
+def cached_zone(zone):
+    return api_get(f"/zone/{zone}")
+
+@st.cache_data(ttl=5)
+def cached_neighbors(account_id):
+    return api_get(f"/fraud-neighbors/{account_id}")
+
+def none_on_error(cached_fetch):
+    """Page-facing fetch: the cached result, or None (uncached) if the call failed"""
+    def fetch(*args):
+        try:
+            return cached_fetch(*args)
+        except Exception:
+            return None
+    return fetch
+
+fetch_stats = none_on_error(cached_stats)
+fetch_account = none_on_error(cached_account)
+fetch_zone = none_on_error(cached_zone)
+fetch_neighbors = none_on_error(cached_neighbors)
+
+def fetch_concurrently(*calls):
+    """
+    Run independent fetches at the same time so the page waits for the
+    slowest one rather than the sum. Each call is (fn, *args). Workers get
+    the script context so st.cache_data works inside them.
+    """
+    with ThreadPoolExecutor(max_workers=len(calls),
+                            initializer=add_script_run_ctx,
+                            initargs=(None, get_script_run_ctx())) as pool:
+        futures = [pool.submit(fn, *args) for fn, *args in calls]
+        return [f.result() for f in futures]
 
 def post_transaction(payload):
     try:
-        r = requests.post(f"{API_URL}/transaction", json=payload, timeout=10)
+        r = http_session().post(f"{API_URL}/transaction", json=payload, timeout=10)
         return r.json() if r.status_code == 200 else None
     except:
         return None
 
 def zone_color(zone):
-    return {"Critical": "#ff3b3b", "Exposed": "#f5a623", "Clean": "#00d4aa"}.get(zone, "#7a9cc5")
+    return ZONE_COLORS.get(zone, ZONE_DEFAULT_COLOR)
 
 def risk_bar_html(label, value, color):
     pct = int(value * 100)
@@ -250,6 +290,10 @@ def risk_bar_html(label, value, color):
 
 # ── SIDEBAR ──────────────────────────────────────────────────────────────────
 with st.sidebar:
+    # Runs before the fetches below, so the same rerun picks up fresh data
+    if st.button("🔄 Refresh data", key="refresh_btn"):
+        cached_stats.clear()
+        cached_zone.clear()
     st.markdown("### ⚙️ Formula Controls")
     st.markdown("---")
     alpha = st.slider("Alpha — Structural Weight", 0.1, 0.9, 0.6, 0.1)
@@ -291,8 +335,8 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# ── FETCH STATS ──────────────────────────────────────────────────────────────
-stats = fetch_stats()
+# ── FETCH STATS + EXPOSED ────────────────────────────────────────────────────
+stats, exposed_data = fetch_concurrently((fetch_stats,), (fetch_zone, "Exposed"))
 if not stats:
     st.markdown("""
     <div class="alert-critical">
@@ -366,7 +410,6 @@ with col2:
 
 with col3:
     st.markdown('<div class="section-header"><span class="section-title">Contamination Score Distribution</span><div class="section-line"></div></div>', unsafe_allow_html=True)
-    exposed_data = fetch_zone("Exposed")
     if exposed_data and exposed_data.get("accounts"):
         scores = [a["contamination_score"] for a in exposed_data["accounts"]]
         fig_hist = go.Figure(go.Histogram(x=scores, nbinsx=20, marker=dict(color="#f5a623", opacity=0.7, line=dict(color="#f5a623", width=0.5)), hovertemplate="Score: %{x:.2f}<br>Count: %{y}<extra></extra>"))
@@ -387,8 +430,8 @@ with left_col:
         lookup_id = st.text_input("ACCOUNT ID", value="ACC00247", placeholder="e.g. ACC00007", label_visibility="visible")
         if st.button("RUN RISK ANALYSIS", key="lookup_btn"):
             with st.spinner(""):
-                data = fetch_account(lookup_id)
-                neighbors = fetch_neighbors(lookup_id)
+                data, neighbors = fetch_concurrently((fetch_account, lookup_id),
+                                                     (fetch_neighbors, lookup_id))
             if data:
                 zone = data.get("zone", "Unknown")
                 risk = data.get("contamination_score", 0) or 0
@@ -463,6 +506,10 @@ with right_col:
             with st.spinner(""):
                 result = post_transaction({"sender_id": sim_sender, "receiver_id": sim_receiver, "amount": sim_amount, "hour": sim_hour})
             if result:
+                # Sender's risk and zone just changed, drop the stale reads
+                cached_account.clear()
+                cached_stats.clear()
+                cached_zone.clear()
                 zone = result.get("zone", "Unknown")
                 risk = result.get("risk_score", 0)
                 drift = result.get("drift_score", 0)
@@ -4,6 +4,7 @@ from dotenv import load_dotenv
 import os
 import random
 import uuid
+import numpy as np
 from datetime import datetime, timedelta
 
 load_dotenv("config/.env")
@@ -24,147 +25,178 @@ START_DATE = datetime.now() - timedelta(days=90)
 NUM_ACCOUNTS = 2000
 NUM_DEVICES = 200
 NUM_TRANSACTIONS = 20000
+BATCH_SIZE = 1000  # rows per UNWIND query
 # ----------------------------
 
-def random_timestamp():
-    return START_DATE + timedelta(
-        seconds=random.randint(0, 90 * 24 * 3600)
-    )
-
-def create_accounts(session, account_ids):
-    for acc_id in account_ids:
-        session.run("""
-            MERGE (a:Account {account_id: $account_id})
-            SET a.name = $name,
-                a.zone = 'Clean',
-                a.is_fraud = false,
-                a.contamination_score = 0.0,
-                a.drift_score = 0.0,
-                a.fingerprint_updated_at = null
-        """, account_id=acc_id, name=fake.name())
+def random_timestamps(n):
+    """n random ISO timestamps within the 90-day window, formatted in one pass"""
+    offsets = np.random.randint(0, 90 * 24 * 3600 + 1, size=n).astype("timedelta64[s]")
+    return np.datetime_as_string(np.datetime64(START_DATE) + offsets).tolist()
+
+def chunks(rows, size=BATCH_SIZE):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+def run_batched(session, query, rows):
+    """Send rows to an UNWIND $rows query, BATCH_SIZE rows per round-trip"""
+    for batch in chunks(rows):
+        session.run(query, rows=batch)
+
+def ensure_schema(session):
+    """
+    Same constraints/indexes as graph/schema.py (same names, so these are
+    no-ops if schema setup already ran). Every MERGE/MATCH by id below
+    then resolves through an index seek instead of a label scan.
+    """
+    session.run("""
+        CREATE CONSTRAINT account_id_unique IF NOT EXISTS
+        FOR (a:Account) REQUIRE a.account_id IS UNIQUE
+    """)
+    session.run("""
+        CREATE CONSTRAINT device_id_unique IF NOT EXISTS
+        FOR (d:Device) REQUIRE d.device_id IS UNIQUE
+    """)
+    session.run("""
+        CREATE CONSTRAINT ip_id_unique IF NOT EXISTS
+        FOR (i:IP) REQUIRE i.ip_address IS UNIQUE
+    """)
+    session.run("""
+        CREATE INDEX account_fraud IF NOT EXISTS
+        FOR (a:Account) ON (a.is_fraud)
+    """)
+    print("✅ Schema indexes in place")
+
+def create_accounts(session, account_ids, names):
+    rows = [{"account_id": acc_id, "name": name} for acc_id, name in zip(account_ids, names)]
+    run_batched(session, """
+        UNWIND $rows AS row
+        MERGE (a:Account {account_id: row.account_id})
+        SET a.name = row.name,
+            a.zone = 'Clean',
+            a.is_fraud = false,
+            a.contamination_score = 0.0,
+            a.drift_score = 0.0,
+            a.fingerprint_updated_at = null
+    """, rows)
     print(f"✅ {len(account_ids)} accounts created")
 
 def mark_fraud_accounts(session, fraud_ids):
-    for acc_id in fraud_ids:
-        session.run("""
-            MATCH (a:Account {account_id: $account_id})
-            SET a.is_fraud = true,
-                a.zone = 'Critical',
-                a.contamination_score = 1.0
-        """, account_id=acc_id)
+    rows = [{"account_id": acc_id} for acc_id in fraud_ids]
+    run_batched(session, """
+        UNWIND $rows AS row
+        MATCH (a:Account {account_id: row.account_id})
+        SET a.is_fraud = true,
+            a.zone = 'Critical',
+            a.contamination_score = 1.0
+    """, rows)
     print(f"✅ {len(fraud_ids)} accounts marked as fraud")
 
 def create_devices(session, device_ids):
-    for dev_id in device_ids:
-        session.run("""
-            MERGE (d:Device {device_id: $device_id})
-            SET d.type = $type
-        """, device_id=dev_id, type=random.choice(["mobile", "desktop", "tablet"]))
+    rows = [{"device_id": dev_id, "type": random.choice(["mobile", "desktop", "tablet"])}
+            for dev_id in device_ids]
+    run_batched(session, """
+        UNWIND $rows AS row
+        MERGE (d:Device {device_id: row.device_id})
+        SET d.type = row.type
+    """, rows)
     print(f"✅ {len(device_ids)} devices created")
 
 def create_ips(session, ip_list):
-    for ip in ip_list:
-        session.run("""
-            MERGE (i:IP {ip_address: $ip_address})
-        """, ip_address=ip)
+    rows = [{"ip_address": ip} for ip in ip_list]
+    run_batched(session, """
+        UNWIND $rows AS row
+        MERGE (i:IP {ip_address: row.ip_address})
+    """, rows)
     print(f"✅ {len(ip_list)} IP nodes created")
 
 def link_accounts_to_devices(session, account_ids, device_ids):
-    for acc_id in account_ids:
-        # Each account uses 1-3 devices
-        devices = random.sample(device_ids, k=random.randint(1, 3))
-        for dev_id in devices:
-            session.run("""
-                MATCH (a:Account {account_id: $account_id})
-                MATCH (d:Device {device_id: $device_id})
-                MERGE (a)-[:USES_DEVICE]->(d)
-            """, account_id=acc_id, device_id=dev_id)
+    # Each account uses 1-3 devices
+    rows = [{"account_id": acc_id, "device_id": dev_id}
+            for acc_id in account_ids
+            for dev_id in random.sample(device_ids, k=random.randint(1, 3))]
+    run_batched(session, """
+        UNWIND $rows AS row
+        MATCH (a:Account {account_id: row.account_id})
+        MATCH (d:Device {device_id: row.device_id})
+        MERGE (a)-[:USES_DEVICE]->(d)
+    """, rows)
     print("✅ Accounts linked to devices")
 
 def link_accounts_to_ips(session, account_ids, ip_list):
-    for acc_id in account_ids:
-        ips = random.sample(ip_list, k=random.randint(1, 2))
-        for ip in ips:
-            session.run("""
-                MATCH (a:Account {account_id: $account_id})
-                MATCH (i:IP {ip_address: $ip_address})
-                MERGE (a)-[:USES_IP]->(i)
-            """, account_id=acc_id, ip_address=ip)
+    rows = [{"account_id": acc_id, "ip_address": ip}
+            for acc_id in account_ids
+            for ip in random.sample(ip_list, k=random.randint(1, 2))]
+    run_batched(session, """
+        UNWIND $rows AS row
+        MATCH (a:Account {account_id: row.account_id})
+        MATCH (i:IP {ip_address: row.ip_address})
+        MERGE (a)-[:USES_IP]->(i)
+    """, rows)
     print("✅ Accounts linked to IPs")
 
-def create_transactions(session, account_ids):
-    for _ in range(NUM_TRANSACTIONS):
-        sender = random.choice(account_ids)
-        receiver = random.choice(account_ids)
-        if sender == receiver:
-            continue
-
-        txn_id = str(uuid.uuid4())
-        amount = round(random.uniform(10, 15000), 2)
-        timestamp = random_timestamp()
-
-        session.run("""
-            MATCH (sender:Account {account_id: $sender_id})
-            MATCH (receiver:Account {account_id: $receiver_id})
-            CREATE (t:Transaction {
-                transaction_id: $txn_id,
-                amount: $amount,
-                timestamp: $timestamp,
-                flagged: false
-            })
-            CREATE (sender)-[:SENT]->(t)
-            CREATE (t)-[:RECEIVED]->(receiver)
-        """, sender_id=sender, receiver_id=receiver,
-             txn_id=txn_id, amount=amount,
-             timestamp=timestamp.isoformat())
+# Shared by normal and injected transactions; flagged is set per row
+CREATE_TRANSACTIONS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (sender:Account {account_id: row.sender_id})
+    MATCH (receiver:Account {account_id: row.receiver_id})
+    CREATE (t:Transaction {
+        transaction_id: row.txn_id,
+        amount: row.amount,
+        timestamp: row.timestamp,
+        flagged: row.flagged
+    })
+    CREATE (sender)-[:SENT]->(t)
+    CREATE (t)-[:RECEIVED]->(receiver)
+"""
+
+def transaction_row(sender, receiver, amount, timestamp, flagged=False):
+    return {
+        "sender_id": sender,
+        "receiver_id": receiver,
+        "txn_id": str(uuid.uuid4()),
+        "amount": amount,
+        "timestamp": timestamp,
+        "flagged": flagged
+    }
 
+def create_transactions(session, account_ids):
+    # Draw every sender, receiver and amount in bulk instead of per transaction
+    senders = random.choices(account_ids, k=NUM_TRANSACTIONS)
+    receivers = random.choices(account_ids, k=NUM_TRANSACTIONS)
+    amounts = np.round(np.random.uniform(10, 15000, NUM_TRANSACTIONS), 2).tolist()
+    timestamps = random_timestamps(NUM_TRANSACTIONS)
+
+    rows = [transaction_row(sender, receiver, amount, timestamp)
+            for sender, receiver, amount, timestamp
+            in zip(senders, receivers, amounts, timestamps)
+            if sender != receiver]
+
+    run_batched(session, CREATE_TRANSACTIONS_QUERY, rows)
     print(f"✅ {NUM_TRANSACTIONS} transactions created")
 
 def inject_fraud_patterns(session, fraud_ids, account_ids):
     normal_ids = [a for a in account_ids if a not in fraud_ids]
+    patterns = []  # (sender, receiver, amount, flagged)
 
     # Pattern 1: Circular money flow (3-hop rings)
     for i in range(3):
         a, b, c = random.sample(fraud_ids, 3)
         for sender, receiver in [(a, b), (b, c), (c, a)]:
-            txn_id = str(uuid.uuid4())
-            session.run("""
-                MATCH (s:Account {account_id: $sender_id})
-                MATCH (r:Account {account_id: $receiver_id})
-                CREATE (t:Transaction {
-                    transaction_id: $txn_id,
-                    amount: $amount,
-                    timestamp: $timestamp,
-                    flagged: true
-                })
-                CREATE (s)-[:SENT]->(t)
-                CREATE (t)-[:RECEIVED]->(r)
-            """, sender_id=sender, receiver_id=receiver,
-                 txn_id=txn_id,
-                 amount=round(random.uniform(8000, 15000), 2),
-                 timestamp=random_timestamp().isoformat())
+            amount = round(random.uniform(8000, 15000), 2)
+            patterns.append((sender, receiver, amount, True))
 
     # Pattern 2: Fraud accounts connected to normal accounts (contamination spread)
     for fraud_id in fraud_ids:
         targets = random.sample(normal_ids, k=random.randint(2, 5))
         for target in targets:
-            txn_id = str(uuid.uuid4())
-            session.run("""
-                MATCH (s:Account {account_id: $sender_id})
-                MATCH (r:Account {account_id: $receiver_id})
-                CREATE (t:Transaction {
-                    transaction_id: $txn_id,
-                    amount: $amount,
-                    timestamp: $timestamp,
-                    flagged: false
-                })
-                CREATE (s)-[:SENT]->(t)
-                CREATE (t)-[:RECEIVED]->(r)
-            """, sender_id=fraud_id, receiver_id=target,
-                 txn_id=txn_id,
-                 amount=round(random.uniform(500, 5000), 2),
-                 timestamp=random_timestamp().isoformat())
+            amount = round(random.uniform(500, 5000), 2)
+            patterns.append((fraud_id, target, amount, False))
+
+    timestamps = random_timestamps(len(patterns))
+    rows = [transaction_row(sender, receiver, amount, timestamp, flagged)
+            for (sender, receiver, amount, flagged), timestamp in zip(patterns, timestamps)]
 
+    run_batched(session, CREATE_TRANSACTIONS_QUERY, rows)
     print("✅ Fraud patterns injected")
 
 def run():
@@ -172,11 +204,15 @@ def run():
     device_ids = [f"DEV{str(i).zfill(4)}" for i in range(NUM_DEVICES)]
     ip_list = [fake.ipv4() for _ in range(NUM_IPS)]
     fraud_ids = random.sample(account_ids, FRAUD_ACCOUNTS)
+    # Names are shown by the API/dashboard, so keep Faker but draw them all
+    # up front rather than while a session is open
+    names = [fake.name() for _ in account_ids]
 
     print("\n🚀 Starting data generation...\n")
 
     with driver.session() as session:
-        create_accounts(session, account_ids)
+        ensure_schema(session)
+        create_accounts(session, account_ids, names)
         mark_fraud_accounts(session, fraud_ids)
         create_devices(session, device_ids)
         create_ips(session, ip_list)
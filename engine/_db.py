@@ -0,0 +1,33 @@
+from neo4j import GraphDatabase
+from dotenv import load_dotenv
+import os
+import threading
+
+# One driver (and connection pool) shared by every engine module, the
+# pipeline and the API. Created on first use, so importing a module does
+# not read config or touch Neo4j.
+_driver = None
+_driver_lock = threading.Lock()
+
+def get_driver():
+    """The shared Neo4j driver, created on first call"""
+    global _driver
+    if _driver is None:
+        with _driver_lock:
+            if _driver is None:
+                load_dotenv("config/.env")
+                _driver = GraphDatabase.driver(
+                    os.getenv("NEO4J_URI"),
+                    auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD")),
+                    max_connection_pool_size=50,
+                    connection_acquisition_timeout=60
+                )
+    return _driver
+
+def close_driver():
+    """Close the shared driver, if it was ever created"""
+    global _driver
+    with _driver_lock:
+        if _driver is not None:
+            _driver.close()
+            _driver = None
@@ -1,26 +1,15 @@
-from neo4j import GraphDatabase
-from dotenv import load_dotenv
-import os
 import math
+import numpy as np
 from datetime import datetime
-
-load_dotenv("config/.env")
-
-driver = GraphDatabase.driver(
-    os.getenv("NEO4J_URI"),
-    auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD"))
-)
+from engine._db import get_driver, close_driver
 
 # ---------- CONFIG ----------
 ALPHA = 0.6   # weight for structural contamination (hop distance)
 BETA  = 0.4   # weight for behavioral drift
 
-HOP_SCORES = {
-    1: 1.0,
-    2: 0.6,
-    3: 0.3,
-    4: 0.1
-}
+# Indexed by hop distance: index 0 = no path to fraud (None),
+# last entry = anything beyond 4 hops
+HOP_SCORES = (0.0, 1.0, 0.6, 0.3, 0.1, 0.05)
 
 ZONE_THRESHOLDS = {
     "Critical": 0.75,
@@ -31,43 +20,104 @@ ZONE_THRESHOLDS = {
 RECOVERY_LAMBDA = 0.1  # decay rate per day of clean behavior
 # ----------------------------
 
-def get_hop_distance(account_id):
+HOP_SCORE_ARRAY = np.array(HOP_SCORES)
+MAX_HOP_INDEX = len(HOP_SCORES) - 1
+
+def get_hop_distance(tx, account_id):
+    """
+    Hop distance from this account to the nearest confirmed fraud account.
+    Reads the hop_distance stored by the last contamination pass; only
+    searches the graph for accounts that have never been scored.
+    Returns integer 1-4, or None if no connection found.
+    Runs on a caller-provided session or transaction.
+    """
+    # hop_distance is null both for "unreachable" and "never computed",
+    # last_updated tells the two apart
+    record = tx.run("""
+        MATCH (a:Account {account_id: $account_id})
+        RETURN a.hop_distance as hop_distance,
+               a.last_updated IS NOT NULL as scored
+    """, account_id=account_id).single()
+
+    if record and record["scored"]:
+        return record["hop_distance"]
+
+    return search_hop_distance(tx, account_id)
+
+def search_hop_distance(tx, account_id, max_hops=4):
     """
     Find shortest hop distance from this account
     to any confirmed fraud account via transactions.
     Returns integer 1-4, or None if no connection found.
     """
-    with driver.session() as session:
-        result = session.run("""
-            MATCH path = shortestPath(
-                (a:Account {account_id: $account_id})-[:SENT|RECEIVED*..8]-(f:Account)
-            )
-            WHERE f.is_fraud = true
-            AND a.account_id <> f.account_id
-            RETURN length(path) as hops
-            ORDER BY hops ASC
-            LIMIT 1
-        """, account_id=account_id)
-
-        record = result.single()
-        if not record:
-            return None
-
-        hops = record["hops"]
-        # Normalize path length to hop count
-        # Each transaction hop = 2 relationships (SENT + RECEIVED)
-        hop_count = math.ceil(hops / 2)
-        return min(hop_count, 4)
+    # Single-source version of get_all_hop_distances: one query per hop
+    # level, stopping at the first level that reaches a fraud account.
+    # Plain Cypher, so it does not depend on APOC being installed.
+    frontier = [account_id]
+    visited = {account_id}
+
+    for hop in range(1, max_hops + 1):
+        # One transaction hop = SENT + RECEIVED between two accounts
+        result = tx.run("""
+            MATCH (a:Account)-[:SENT|RECEIVED]-(:Transaction)-[:SENT|RECEIVED]-(n:Account)
+            WHERE a.account_id IN $frontier
+            RETURN DISTINCT n.account_id as account_id,
+                   coalesce(n.is_fraud, false) as is_fraud
+        """, frontier=frontier)
+
+        frontier = []
+        for r in result:
+            if r["account_id"] in visited:
+                continue
+            if r["is_fraud"]:
+                return hop
+            visited.add(r["account_id"])
+            frontier.append(r["account_id"])
+
+        if not frontier:
+            break
+
+    return None
+
+def get_all_hop_distances(tx, max_hops=4):
+    """
+    Hop distance to the nearest confirmed fraud account for every account,
+    via one multi-source BFS outward from all fraud accounts.
+    Costs one query per hop level instead of one shortestPath per account.
+    Returns {account_id: hop_count}; accounts beyond max_hops are absent.
+    """
+    result = tx.run("""
+        MATCH (f:Account {is_fraud: true})
+        RETURN f.account_id as account_id
+    """)
+    frontier = [r["account_id"] for r in result]
+    visited = set(frontier)
+    hop_distances = {}
+
+    for hop in range(1, max_hops + 1):
+        if not frontier:
+            break
+
+        # One transaction hop = SENT + RECEIVED between two accounts
+        result = tx.run("""
+            MATCH (a:Account)-[:SENT|RECEIVED]-(:Transaction)-[:SENT|RECEIVED]-(n:Account)
+            WHERE a.account_id IN $frontier
+            RETURN DISTINCT n.account_id as account_id
+        """, frontier=frontier)
+
+        frontier = [r["account_id"] for r in result if r["account_id"] not in visited]
+        visited.update(frontier)
+        for account_id in frontier:
+            hop_distances[account_id] = hop
+
+    return hop_distances
 
 def compute_contamination_score(hop_distance, drift_score):
     """
     Core formula:
     Risk(v) = alpha * ContaminationScore(hops) + beta * DriftScore(v)
     """
-    if hop_distance is None:
-        structural_score = 0.0
-    else:
-        structural_score = HOP_SCORES.get(hop_distance, 0.05)
+    structural_score = HOP_SCORES[min(hop_distance or 0, MAX_HOP_INDEX)]
 
     risk = (ALPHA * structural_score) + (BETA * drift_score)
     return round(min(risk, 1.0), 4)
@@ -96,31 +146,11 @@ def apply_recovery(current_contamination, drift_score, days_clean):
     decayed = current_contamination * math.exp(-RECOVERY_LAMBDA * days_clean)
     return round(max(decayed, 0.0), 4)
 
-def update_account_risk(account_id, drift_score):
-    """
-    Full pipeline for one account:
-    1. Get hop distance to fraud
-    2. Compute risk score
-    3. Classify zone
-    4. Save back to Neo4j
-    """
-    hop_distance = get_hop_distance(account_id)
+def score_account(account_id, hop_distance, drift_score):
+    """Compute risk score and zone for an account with a known hop distance"""
     risk_score = compute_contamination_score(hop_distance, drift_score)
     zone = classify_zone(risk_score)
 
-    with driver.session() as session:
-        session.run("""
-            MATCH (a:Account {account_id: $account_id})
-            SET a.contamination_score = $risk_score,
-                a.zone = $zone,
-                a.hop_distance = $hop_distance,
-                a.last_updated = $last_updated
-        """, account_id=account_id,
-             risk_score=risk_score,
-             zone=zone,
-             hop_distance=hop_distance,
-             last_updated=datetime.now().isoformat())
-
     return {
         "account_id": account_id,
         "hop_distance": hop_distance,
@@ -129,31 +159,89 @@ def update_account_risk(account_id, drift_score):
         "zone": zone
     }
 
+def score_accounts(account_ids, hop_distances, drift_scores):
+    """
+    Vectorized score_account over a batch of accounts.
+    hop_distances may contain None (no path to fraud).
+    Returns the same list of dicts score_account would.
+    """
+    hops = np.array([h or 0 for h in hop_distances], dtype=np.int64)
+    drift = np.asarray(drift_scores, dtype=np.float64)
+
+    structural = HOP_SCORE_ARRAY[np.clip(hops, 0, MAX_HOP_INDEX)]
+    risk = np.round(np.minimum(ALPHA * structural + BETA * drift, 1.0), 4)
+    zones = np.select(
+        [risk >= ZONE_THRESHOLDS["Critical"], risk >= ZONE_THRESHOLDS["Exposed"]],
+        ["Critical", "Exposed"],
+        default="Clean"
+    )
+
+    return [
+        {
+            "account_id": account_id,
+            "hop_distance": hop_distance,
+            "drift_score": drift_score,
+            "risk_score": risk_score,
+            "zone": zone
+        }
+        for account_id, hop_distance, drift_score, risk_score, zone
+        in zip(account_ids, hop_distances, drift_scores, risk.tolist(), zones.tolist())
+    ]
+
+def save_account_risks(tx, results):
+    """Write a batch of score_account results back to Neo4j in one query"""
+    tx.run("""
+        UNWIND $rows AS r
+        MATCH (a:Account {account_id: r.account_id})
+        SET a.contamination_score = r.risk_score,
+            a.zone = r.zone,
+            a.hop_distance = r.hop_distance,
+            a.last_updated = $last_updated
+    """, rows=results, last_updated=datetime.now().isoformat())
+
+def update_account_risk(session, account_id, drift_score):
+    """
+    Full pipeline for one account, on the caller's session:
+    1. Get hop distance to fraud
+    2. Compute risk score
+    3. Classify zone
+    4. Save back to Neo4j
+    """
+    hop_distance = session.execute_read(get_hop_distance, account_id)
+    result = score_account(account_id, hop_distance, drift_score)
+    session.execute_write(save_account_risks, [result])
+    return result
+
 def run_full_contamination_pass():
     """
     Run contamination scoring across all non-fraud accounts.
     Uses stored drift_score from each node.
     """
-    with driver.session() as session:
-        result = session.run("""
+    # One session for the whole pass: a read transaction for the inputs,
+    # a write transaction for the results
+    with get_driver().session() as session:
+        accounts = session.execute_read(lambda tx: tx.run("""
             MATCH (a:Account)
             WHERE a.is_fraud = false
             RETURN a.account_id as account_id,
                    coalesce(a.drift_score, 0.0) as drift_score
-        """)
-        accounts = [{"account_id": r["account_id"],
-                     "drift_score": r["drift_score"]} for r in result]
+        """).data())
+
+        print(f"\n🔄 Running contamination pass on {len(accounts)} accounts...\n")
 
-    print(f"\n🔄 Running contamination pass on {len(accounts)} accounts...\n")
+        hop_distances = session.execute_read(get_all_hop_distances)
 
-    zone_counts = {"Critical": 0, "Exposed": 0, "Clean": 0}
+        account_ids = [acc["account_id"] for acc in accounts]
+        updates = score_accounts(account_ids,
+                                 [hop_distances.get(a) for a in account_ids],
+                                 [acc["drift_score"] for acc in accounts])
 
-    for i, acc in enumerate(accounts):
-        result = update_account_risk(acc["account_id"], acc["drift_score"])
-        zone_counts[result["zone"]] += 1
+        zone_counts = {"Critical": 0, "Exposed": 0, "Clean": 0}
+        for result in updates:
+            zone_counts[result["zone"]] += 1
 
-        if (i + 1) % 50 == 0:
-            print(f"   Processed {i + 1}/{len(accounts)}...")
+        # Single write for the whole pass
+        session.execute_write(save_account_risks, updates)
 
     print(f"\n✅ Contamination pass complete")
     print(f"   🔴 Critical : {zone_counts['Critical']}")
@@ -170,18 +258,19 @@ def test_specific_accounts():
         ("ACC00247", 0.05),  # same account, low drift
     ]
 
-    for account_id, mock_drift in test_cases:
-        hop = get_hop_distance(account_id)
-        risk = compute_contamination_score(hop, mock_drift)
-        zone = classify_zone(risk)
-        print(f"Account : {account_id}")
-        print(f"Hops    : {hop}")
-        print(f"Drift   : {mock_drift}")
-        print(f"Risk    : {risk}")
-        print(f"Zone    : {zone}")
-        print()
+    with get_driver().session() as session:
+        for account_id, mock_drift in test_cases:
+            hop = session.execute_read(get_hop_distance, account_id)
+            risk = compute_contamination_score(hop, mock_drift)
+            zone = classify_zone(risk)
+            print(f"Account : {account_id}")
+            print(f"Hops    : {hop}")
+            print(f"Drift   : {mock_drift}")
+            print(f"Risk    : {risk}")
+            print(f"Zone    : {zone}")
+            print()
 
 if __name__ == "__main__":
     test_specific_accounts()
     run_full_contamination_pass()
-    driver.close()
\ No newline at end of file
+    close_driver()
\ No newline at end of file
@@ -1,83 +1,267 @@
-from neo4j import GraphDatabase
-from dotenv import load_dotenv
+from neo4j import RoutingControl
 import os
+import re
 import numpy as np
+import threading
+from cachetools import TTLCache
 from datetime import datetime, timedelta
-
-load_dotenv("config/.env")
-
-driver = GraphDatabase.driver(
-    os.getenv("NEO4J_URI"),
-    auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD"))
+from engine._db import get_driver, close_driver
+from engine.fingerprint import FINGERPRINT_SNAPSHOT, HOUR_VECTOR_DTYPE, fingerprint_generation
+
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional - the drift math runs as plain Python without it
+    def njit(*args, **kwargs):
+        return lambda fn: fn
+
+FINGERPRINT_QUERY = """
+    MATCH (a:Account {account_id: $account_id})
+    RETURN a.hour_vector_b as hour_vector_b,
+           a.hour_vector as hour_vector,
+           a.amount_mean as amount_mean,
+           a.amount_std as amount_std,
+           a.daily_velocity as daily_velocity,
+           a.counterparty_weekly as counterparty_weekly,
+           a.device_count as device_count
+"""
+
+FINGERPRINTS_QUERY = """
+    UNWIND $account_ids AS account_id
+    MATCH (a:Account {account_id: account_id})
+    WHERE a.amount_mean IS NOT NULL
+    RETURN a.account_id as account_id,
+           a.hour_vector_b as hour_vector_b,
+           a.hour_vector as hour_vector,
+           a.amount_mean as amount_mean,
+           a.amount_std as amount_std,
+           a.daily_velocity as daily_velocity,
+           a.counterparty_weekly as counterparty_weekly,
+           a.device_count as device_count
+"""
+
+RECENT_TRANSACTIONS_QUERY = """
+    MATCH (a:Account {account_id: $account_id})-[:SENT]->(t:Transaction)
+    WHERE t.timestamp >= $cutoff
+    RETURN t.amount as amount, t.timestamp as timestamp
+"""
+
+SAVE_DRIFT_SCORE_QUERY = """
+    MATCH (a:Account {account_id: $account_id})
+    SET a.drift_score = $drift_score
+"""
+
+SAVE_DRIFT_SCORES_QUERY = """
+    UNWIND $rows AS r
+    MATCH (a:Account {account_id: r.account_id})
+    SET a.drift_score = r.drift_score
+"""
+
+ISO_TIMESTAMP = re.compile(
+    r"\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])"
+    r"([T ]([01]\d|2[0-3])(:[0-5]\d(:[0-5]\d(\.\d{1,6})?)?)?)?$"
 )
 
+# Last loaded FINGERPRINT_SNAPSHOT, rewritten by fingerprint.run_all_accounts
+snapshot = None  # (mtime, {account_id: row}, arrays), swapped in whole on reload
+
+# Fingerprints only change on a refresh, so drift scoring reuses the last
+# load for a few minutes instead of querying Neo4j on every transaction
+fingerprint_cache = TTLCache(maxsize=100_000, ttl=300)
+fingerprint_cache_lock = threading.Lock()
+# (snapshot mtime, fingerprint_generation()) the cache was filled under
+fingerprint_cache_state = None
+
+def check_fingerprint_cache():
+    """Drop cached fingerprints once a new snapshot or an in-process write has replaced them"""
+    global fingerprint_cache_state
+    current = load_snapshot()
+    state = (current[0] if current else None, fingerprint_generation())
+    if state != fingerprint_cache_state:
+        with fingerprint_cache_lock:
+            fingerprint_cache.clear()
+            fingerprint_cache_state = state
+
 def get_fingerprint(account_id):
-    """Load stored fingerprint from Neo4j node"""
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (a:Account {account_id: $account_id})
-            RETURN a.hour_vector as hour_vector,
-                   a.amount_mean as amount_mean,
-                   a.amount_std as amount_std,
-                   a.daily_velocity as daily_velocity,
-                   a.counterparty_weekly as counterparty_weekly,
-                   a.device_count as device_count
-        """, account_id=account_id)
-
-        record = result.single()
-        if not record or record["amount_mean"] is None:
-            return None
-
-        return {
-            "hour_vector": record["hour_vector"],
-            "amount_mean": record["amount_mean"],
-            "amount_std": record["amount_std"],
-            "daily_velocity": record["daily_velocity"],
-            "counterparty_weekly": record["counterparty_weekly"],
-            "device_count": record["device_count"]
-        }
-
-def get_recent_transactions(account_id, hours=24):
-    """Get transactions from the last N hours"""
-    cutoff = (datetime.now() - timedelta(hours=hours)).isoformat()
-
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (a:Account {account_id: $account_id})-[:SENT]->(t:Transaction)
-            WHERE t.timestamp >= $cutoff
-            RETURN t.amount as amount, t.timestamp as timestamp
-        """, account_id=account_id, cutoff=cutoff)
-
-        return [{"amount": r["amount"], "timestamp": r["timestamp"]} for r in result]
-
-def compute_time_drift(fingerprint, new_transaction_hour):
+    """Load stored fingerprint, from the cache when it is warm"""
+    check_fingerprint_cache()
+    with fingerprint_cache_lock:
+        fingerprint = fingerprint_cache.get(account_id)
+    if fingerprint is not None:
+        return fingerprint
+
+    fingerprint = load_fingerprint(account_id)
+    if fingerprint is not None:
+        with fingerprint_cache_lock:
+            fingerprint_cache[account_id] = fingerprint
+    return fingerprint
+
+def clear_fingerprint_cache():
+    """Drop cached fingerprints, e.g. after a fingerprint refresh"""
+    with fingerprint_cache_lock:
+        fingerprint_cache.clear()
+
+def get_fingerprints(account_ids):
+    """
+    Batch get_fingerprint: one Neo4j query for every uncached account.
+    Returns {account_id: fingerprint}; accounts without one are left out.
+    """
+    check_fingerprint_cache()
+    fingerprints = {}
+    with fingerprint_cache_lock:
+        for account_id in set(account_ids):
+            fingerprint = fingerprint_cache.get(account_id)
+            if fingerprint is not None:
+                fingerprints[account_id] = fingerprint
+    missing = [a for a in set(account_ids) if a not in fingerprints]
+
+    if missing:
+        loaded = load_fingerprints(missing)
+        with fingerprint_cache_lock:
+            fingerprint_cache.update(loaded)
+        fingerprints.update(loaded)
+    return fingerprints
+
+def load_snapshot():
+    """Current fingerprint snapshot, re-read from disk when a refresh has rewritten it"""
+    global snapshot
+    try:
+        mtime = os.path.getmtime(FINGERPRINT_SNAPSHOT)
+    except OSError:
+        return None
+
+    current = snapshot
+    if current is None or current[0] != mtime:
+        with np.load(FINGERPRINT_SNAPSHOT) as data:
+            arrays = {name: data[name] for name in data.files}
+        index = {a: i for i, a in enumerate(arrays["account_ids"].tolist())}
+        current = snapshot = (mtime, index, arrays)
+    return current
+
+def snapshot_fingerprint(account_id, current=None):
+    """
+    Fingerprint from the on-disk snapshot, or None if it isn't in there.
+    Batch callers pass one load_snapshot() result for every lookup.
+    """
+    if current is None:
+        current = load_snapshot()
+    if current is None:
+        return None
+    _, index, arrays = current
+    i = index.get(account_id)
+    if i is None:
+        return None
+
+    return {
+        "hour_vector": arrays["hour_vectors"][i],
+        "amount_mean": float(arrays["amount_means"][i]),
+        "amount_std": float(arrays["amount_stds"][i]),
+        "daily_velocity": float(arrays["daily_velocities"][i]),
+        "counterparty_weekly": float(arrays["counterparty_weekly"][i]),
+        "device_count": int(arrays["device_counts"][i])
+    }
+
+def load_fingerprint(account_id):
+    """Load stored fingerprint from the snapshot, or the Neo4j node if it isn't there"""
+    fingerprint = snapshot_fingerprint(account_id)
+    if fingerprint is not None:
+        return fingerprint
+
+    records, _, _ = get_driver().execute_query(
+        FINGERPRINT_QUERY, account_id=account_id, routing_=RoutingControl.READ
+    )
+
+    record = records[0] if records else None
+    if not record or record["amount_mean"] is None:
+        return None
+    return fingerprint_from_record(record)
+
+def load_fingerprints(account_ids):
+    """Load stored fingerprints for a batch of accounts, querying Neo4j once for those not in the snapshot"""
+    fingerprints = {}
+    current = load_snapshot()
+    if current is not None:
+        for account_id in account_ids:
+            fingerprint = snapshot_fingerprint(account_id, current)
+            if fingerprint is not None:
+                fingerprints[account_id] = fingerprint
+    missing = [a for a in account_ids if a not in fingerprints]
+
+    if missing:
+        records, _, _ = get_driver().execute_query(
+            FINGERPRINTS_QUERY, account_ids=missing, routing_=RoutingControl.READ
+        )
+        fingerprints.update((r["account_id"], fingerprint_from_record(r)) for r in records)
+    return fingerprints
+
+def fingerprint_from_record(record):
+    if record["hour_vector_b"] is not None:
+        hour_vector = np.frombuffer(record["hour_vector_b"], dtype=HOUR_VECTOR_DTYPE)
+    else:
+        # Fingerprint written before hour vectors were packed
+        hour_vector = np.asarray(record["hour_vector"] or [], dtype=np.float32)
+
+    return {
+        "hour_vector": hour_vector,
+        "amount_mean": record["amount_mean"],
+        "amount_std": record["amount_std"],
+        "daily_velocity": record["daily_velocity"],
+        "counterparty_weekly": record["counterparty_weekly"],
+        "device_count": record["device_count"]
+    }
+
+def get_recent_transactions(account_id, hours=24, cutoff=None):
+    """
+    Get transactions from the last N hours, as columns:
+    {"amount": float64 array, "timestamp": datetime64[us] array}
+    Timestamps that aren't ISO strings come back as NaT.
+    """
+    if cutoff is None:
+        cutoff = (datetime.now() - timedelta(hours=hours)).isoformat()
+
+    records, _, _ = get_driver().execute_query(
+        RECENT_TRANSACTIONS_QUERY,
+        account_id=account_id, cutoff=cutoff, routing_=RoutingControl.READ
+    )
+
+    ts_strings = [str(r["timestamp"]) for r in records]
+    try:
+        timestamps = np.array(ts_strings, dtype="datetime64[us]")
+    except ValueError:
+        # Blank out malformed rows so the cast still runs in one pass
+        timestamps = np.array([t if ISO_TIMESTAMP.match(t) else "NaT" for t in ts_strings],
+                              dtype="datetime64[us]")
+
+    return {
+        "amount": np.fromiter((r["amount"] for r in records), dtype=np.float64, count=len(records)),
+        "timestamp": timestamps
+    }
+
+@njit(cache=True)
+def compute_time_drift(hour_vector, new_transaction_hour):
     """How unusual is this transaction hour for this account?"""
-    hour_vector = fingerprint["hour_vector"]
-    if not hour_vector or len(hour_vector) != 24:
+    if hour_vector.shape[0] != 24:
         return 0.5  # neutral if no data
 
-    prob = hour_vector[new_transaction_hour]
+    prob = float(hour_vector[new_transaction_hour % 24])
     # Low probability hour = high drift
     time_drift = 1.0 - prob
-    return round(time_drift, 4)
+    return time_drift
 
-def compute_amount_drift(fingerprint, new_amount):
+@njit(cache=True)
+def compute_amount_drift(mean, std, new_amount):
     """How far is this amount from the account's normal range?"""
-    mean = fingerprint["amount_mean"]
-    std = fingerprint["amount_std"]
-
     if std < 1:
         std = 1.0
 
     z_score = abs(new_amount - mean) / std
     # Normalize: z=0 means no drift, z=5+ means extreme drift
     amount_drift = min(z_score / 5.0, 1.0)
-    return round(amount_drift, 4)
+    return amount_drift
 
-def compute_velocity_drift(fingerprint, recent_transaction_count):
+@njit(cache=True)
+def compute_velocity_drift(baseline_daily, recent_transaction_count):
     """Is this account transacting much faster than usual?"""
-    baseline_daily = fingerprint["daily_velocity"]
-
     # For low-velocity accounts, single transactions are normal
     # Only flag when recent count is significantly above baseline
     if baseline_daily < 0.5:
@@ -91,7 +275,33 @@ def compute_velocity_drift(fingerprint, recent_transaction_count):
         velocity_drift = min((ratio - 1) / 4.0, 1.0)
         velocity_drift = max(velocity_drift, 0.0)
 
-    return round(velocity_drift, 4)
+    return velocity_drift
+
+@njit(cache=True)
+def drift_kernel(hour_vector, amount_mean, amount_std, daily_velocity,
+                 hour, amount, recent_count):
+    """Weighted drift score from raw fingerprint values, as native code under numba"""
+    time_drift = compute_time_drift(hour_vector, hour)
+    amount_drift = compute_amount_drift(amount_mean, amount_std, amount)
+    velocity_drift = compute_velocity_drift(daily_velocity, recent_count)
+
+    # Weighted combination
+    # Amount drift weighted highest - most reliable signal
+    drift_score = (
+        0.3 * time_drift +
+        0.4 * amount_drift +
+        0.3 * velocity_drift
+    )
+
+    return round(drift_score, 4)
+
+# Pay the JIT compile once at import instead of on the first scored transaction.
+# numba types read-only arrays separately, and hour vectors decoded from Neo4j
+# (np.frombuffer over bytes) are read-only, so warm up both variants
+_warmup_hour_vector = np.zeros(24, dtype=HOUR_VECTOR_DTYPE)
+drift_kernel(_warmup_hour_vector, 0.0, 1.0, 0.0, 0, 0.0, 0)
+drift_kernel(np.frombuffer(_warmup_hour_vector.tobytes(), dtype=HOUR_VECTOR_DTYPE),
+             0.0, 1.0, 0.0, 0, 0.0, 0)
 
 def compute_drift_score(account_id, new_transaction):
     """
@@ -112,27 +322,96 @@ def compute_drift_score(account_id, new_transaction):
         # No fingerprint yet, return neutral score
         return 0.5
 
-    time_drift = compute_time_drift(fingerprint, new_transaction["hour"])
-    amount_drift = compute_amount_drift(fingerprint, new_transaction["amount"])
-    velocity_drift = compute_velocity_drift(fingerprint, new_transaction["recent_count"])
+    return drift_kernel(
+        fingerprint["hour_vector"],
+        float(fingerprint["amount_mean"]),
+        float(fingerprint["amount_std"]),
+        float(fingerprint["daily_velocity"]),
+        int(new_transaction["hour"]),
+        float(new_transaction["amount"]),
+        int(new_transaction["recent_count"])
+    )
 
-    # Weighted combination
-    # Amount drift weighted highest - most reliable signal
-    drift_score = (
-        0.3 * time_drift +
-        0.4 * amount_drift +
-        0.3 * velocity_drift
+def compute_drift_scores(account_ids, amounts, hours, recent_counts):
+    """
+    Vectorized compute_drift_score over a batch of incoming transactions
+    (backfill / replay). Fingerprints are fetched with one query and the
+    drift math runs as NumPy array ops.
+    Returns the list of scores compute_drift_score would give each row.
+    """
+    fingerprints = get_fingerprints(account_ids)
+    n = len(account_ids)
+
+    has_fp = np.zeros(n, dtype=bool)
+    has_hv = np.zeros(n, dtype=bool)
+    hour_vectors = np.zeros((n, 24), dtype=np.float32)
+    means = np.zeros(n)
+    stds = np.ones(n)
+    velocities = np.zeros(n)
+    for i, account_id in enumerate(account_ids):
+        fp = fingerprints.get(account_id)
+        if fp is None:
+            continue
+        has_fp[i] = True
+        if fp["hour_vector"].shape[0] == 24:
+            has_hv[i] = True
+            hour_vectors[i] = fp["hour_vector"]
+        means[i] = fp["amount_mean"]
+        stds[i] = fp["amount_std"]
+        velocities[i] = fp["daily_velocity"]
+
+    amounts = np.asarray(amounts, dtype=np.float64)
+    hours = np.asarray(hours, dtype=np.int64) % 24
+    counts = np.asarray(recent_counts, dtype=np.float64)
+
+    # Same rules as compute_time_drift / compute_amount_drift / compute_velocity_drift
+    time_drift = np.where(has_hv, 1.0 - hour_vectors[np.arange(n), hours].astype(np.float64), 0.5)
+    amount_drift = np.minimum(np.abs(amounts - means) / np.maximum(stds, 1.0) / 5.0, 1.0)
+
+    low_velocity = velocities < 0.5
+    ratio = np.divide(counts, velocities, out=np.zeros(n), where=~low_velocity)
+    velocity_drift = np.where(
+        low_velocity,
+        np.where(counts <= 2, 0.0, np.minimum((counts - 2) / 8.0, 1.0)),
+        np.clip((ratio - 1) / 4.0, 0.0, 1.0)
     )
 
-    return round(drift_score, 4)
+    drift = 0.3 * time_drift + 0.4 * amount_drift + 0.3 * velocity_drift
+
+    return np.where(has_fp, np.round(drift, 4), 0.5).tolist()
 
 def save_drift_score(account_id, drift_score):
     """Write drift score back to the account node"""
-    with driver.session() as session:
-        session.run("""
-            MATCH (a:Account {account_id: $account_id})
-            SET a.drift_score = $drift_score
-        """, account_id=account_id, drift_score=drift_score)
+    get_driver().execute_query(
+        SAVE_DRIFT_SCORE_QUERY, account_id=account_id, drift_score=drift_score
+    )
+
+class DriftWriter:
+    """
+    Buffered save_drift_score for bulk scoring (backfill / replay):
+    scores are written with one UNWIND query per batch_size accounts.
+    Use as a context manager, or call flush() at the end of the pipeline.
+    """
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self.buffer = []
+
+    def save(self, account_id, drift_score):
+        self.buffer.append({"account_id": account_id, "drift_score": drift_score})
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            get_driver().execute_query(SAVE_DRIFT_SCORES_QUERY, rows=self.buffer)
+            self.buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
 
 def test_drift_scenarios():
     """
@@ -192,4 +471,4 @@ def test_drift_scenarios():
 
 if __name__ == "__main__":
     test_drift_scenarios()
-    driver.close()
\ No newline at end of file
+    close_driver()
\ No newline at end of file
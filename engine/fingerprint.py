@@ -1,103 +1,146 @@
-from neo4j import GraphDatabase
-from dotenv import load_dotenv
+from neo4j import RoutingControl
 import os
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from engine._db import get_driver, close_driver
 
-load_dotenv("config/.env")
-
-driver = GraphDatabase.driver(
-    os.getenv("NEO4J_URI"),
-    auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD"))
-)
-
-def get_account_transactions(account_id, days=90):
-    """Fetch last N days of transactions for an account"""
-    cutoff = (datetime.now() - timedelta(days=days)).isoformat()
-
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (a:Account {account_id: $account_id})-[:SENT]->(t:Transaction)
-            WHERE t.timestamp >= $cutoff
-            RETURN t.amount as amount,
-                   t.timestamp as timestamp,
-                   t.transaction_id as txn_id
-        """, account_id=account_id, cutoff=cutoff)
-
-        transactions = []
-        for record in result:
-            transactions.append({
-                "amount": record["amount"],
-                "timestamp": record["timestamp"],
-                "txn_id": record["txn_id"]
-            })
-
-        return transactions
-
-def get_counterparty_count(account_id, days=90):
-    """How many unique accounts does this account transact with per week"""
-    cutoff = (datetime.now() - timedelta(days=days)).isoformat()
-
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (a:Account {account_id: $account_id})-[:SENT]->
-                  (t:Transaction)-[:RECEIVED]->(receiver:Account)
-            WHERE t.timestamp >= $cutoff
-            RETURN count(DISTINCT receiver) as unique_counterparties
-        """, account_id=account_id, cutoff=cutoff)
-
-        record = result.single()
-        unique = record["unique_counterparties"] if record else 0
-        weeks = days / 7
-        return round(unique / weeks, 2)
-
-def get_device_count(account_id):
-    """How many unique devices does this account use"""
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (a:Account {account_id: $account_id})-[:USES_DEVICE]->(d:Device)
-            RETURN count(d) as device_count
-        """, account_id=account_id)
-
-        record = result.single()
-        return record["device_count"] if record else 0
-
-def compute_fingerprint(account_id):
-    """Compute behavioral fingerprint for one account"""
-    transactions = get_account_transactions(account_id)
+# Persisted as 24 little-endian float32s (hour_vector_b) rather than a list of doubles
+HOUR_VECTOR_DTYPE = np.dtype("<f4")
+
+# Column snapshot of every fingerprint, written after each batch refresh and
+# removed by single-account writes; drift scoring reads it instead of
+# querying Neo4j (see drift.load_snapshot)
+FINGERPRINT_SNAPSHOT = "data/fingerprints.npz"
+
+# Bumped on every fingerprint write from this process, so readers that
+# cache fingerprints (drift.get_fingerprint) know to drop them
+write_generation = 0
+
+# Hour (0-23) of an ISO timestamp string, computed in Cypher. A date-only
+# timestamp is midnight; anything whose hour field isn't 00-23 counts as
+# noon, so every transaction lands in exactly one bucket
+TX_HOUR = r"""
+    CASE
+        WHEN t.timestamp =~ '\\d{4}-\\d{2}-\\d{2}' THEN 0
+        WHEN toInteger(substring(t.timestamp, 11, 2)) >= 0
+         AND toInteger(substring(t.timestamp, 11, 2)) <= 23
+        THEN toInteger(substring(t.timestamp, 11, 2))
+        ELSE 12
+    END
+"""
+
+# Transaction stats are reduced server-side, so each account returns a
+# fixed-size row (count, mean, std, 24 hour buckets) instead of every
+# transaction it sent
+ACCOUNT_HISTORY_QUERY = """
+    MATCH (a:Account {account_id: $account_id})
+    OPTIONAL MATCH (a)-[:SENT]->(t:Transaction)
+    WHERE t.timestamp >= $cutoff
+    OPTIONAL MATCH (t)-[:RECEIVED]->(receiver:Account)
+    WITH a,
+         count(t) as transaction_count,
+         avg(t.amount) as amount_mean,
+         stDevP(t.amount) as amount_std,
+         collect(CASE WHEN t IS NOT NULL THEN """ + TX_HOUR + """ END) as hours,
+         count(DISTINCT receiver) as unique_counterparties
+    OPTIONAL MATCH (a)-[:USES_DEVICE]->(d:Device)
+    RETURN transaction_count, amount_mean, amount_std,
+           [h IN range(0, 23) | size([x IN hours WHERE x = h])] as hour_counts,
+           unique_counterparties,
+           count(d) as device_count
+"""
+
+ALL_TRANSACTION_STATS_QUERY = """
+    MATCH (a:Account)
+    OPTIONAL MATCH (a)-[:SENT]->(t:Transaction)
+    WHERE t.timestamp >= $cutoff
+    WITH a,
+         count(t) as transaction_count,
+         avg(t.amount) as amount_mean,
+         stDevP(t.amount) as amount_std,
+         collect(CASE WHEN t IS NOT NULL THEN """ + TX_HOUR + """ END) as hours
+    RETURN a.account_id as account_id,
+           transaction_count, amount_mean, amount_std,
+           [h IN range(0, 23) | size([x IN hours WHERE x = h])] as hour_counts
+"""
+
+ALL_COUNTERPARTY_COUNTS_QUERY = """
+    MATCH (a:Account)-[:SENT]->(t:Transaction)-[:RECEIVED]->(receiver:Account)
+    WHERE t.timestamp >= $cutoff
+    RETURN a.account_id as account_id,
+           count(DISTINCT receiver) as unique_counterparties
+"""
 
-    if len(transactions) < 3:
+ALL_DEVICE_COUNTS_QUERY = """
+    MATCH (a:Account)-[:USES_DEVICE]->(d:Device)
+    RETURN a.account_id as account_id, count(d) as device_count
+"""
+
+SAVE_FINGERPRINTS_QUERY = """
+    UNWIND $rows AS r
+    MATCH (a:Account {account_id: r.account_id})
+    SET a.hour_vector_b = r.hour_vector_b,
+        a.amount_mean = r.amount_mean,
+        a.amount_std = r.amount_std,
+        a.daily_velocity = r.daily_velocity,
+        a.counterparty_weekly = r.counterparty_weekly,
+        a.device_count = r.device_count,
+        a.fingerprint_updated_at = r.fingerprint_updated_at
+    REMOVE a.hour_vector
+"""
+
+def get_account_history(account_id, days=90, cutoff=None):
+    """
+    Fingerprint inputs for one account - transaction stats, counterparties
+    and devices - in a single query.
+    Returns {"transaction_count", "amount_mean", "amount_std", "hour_counts",
+             "unique_counterparties", "device_count"} or None
+    """
+    if cutoff is None:
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+
+    records, _, _ = get_driver().execute_query(
+        ACCOUNT_HISTORY_QUERY,
+        account_id=account_id, cutoff=cutoff, routing_=RoutingControl.READ
+    )
+
+    return records[0].data() if records else None
+
+def compute_fingerprint(account_id, days=90):
+    """Compute behavioral fingerprint for one account"""
+    history = get_account_history(account_id, days)
+    if history is None or history["transaction_count"] < 3:
         # Not enough history to build fingerprint
         return None
 
+    return build_fingerprint(
+        account_id,
+        transaction_count=history["transaction_count"],
+        amount_mean=history["amount_mean"],
+        amount_std=history["amount_std"],
+        hour_counts=history["hour_counts"],
+        counterparty_weekly=round(history["unique_counterparties"] / (days / 7), 2),
+        device_count=history["device_count"],
+        days=days
+    )
+
+def build_fingerprint(account_id, transaction_count, amount_mean, amount_std, hour_counts,
+                      counterparty_weekly, device_count, days=90, updated_at=None):
+    """
+    Turn one account's aggregated transaction stats into its fingerprint.
+    Batch callers pass one updated_at so every fingerprint shares the run's timestamp.
+    """
     # --- Hour vector (24 buckets) ---
-    hours = []
-    for t in transactions:
-        try:
-            dt = datetime.fromisoformat(str(t["timestamp"]))
-            hours.append(dt.hour)
-        except:
-            hours.append(12)  # default to noon if parse fails
-
-    hour_vector = [0.0] * 24
-    for h in hours:
-        hour_vector[h] += 1
-    total = len(hours)
-    hour_vector = [round(c / total, 4) for c in hour_vector]
+    hour_vector = np.asarray(hour_counts, dtype=np.float64) / transaction_count
+    hour_vector = np.round(hour_vector, 4).tolist()
 
     # --- Amount stats ---
-    amounts = [float(t["amount"]) for t in transactions]
-    amount_mean = round(float(np.mean(amounts)), 2)
-    amount_std = round(float(np.std(amounts)) + 0.01, 2)  # avoid zero std
+    amount_mean = round(float(amount_mean), 2)
+    amount_std = round(float(amount_std) + 0.01, 2)  # avoid zero std
 
     # --- Velocity (transactions per day) ---
-    daily_velocity = round(len(transactions) / 90, 4)
-
-    # --- Counterparty weekly average ---
-    counterparty_weekly = get_counterparty_count(account_id)
-
-    # --- Device count ---
-    device_count = get_device_count(account_id)
+    daily_velocity = round(transaction_count / days, 4)
 
     return {
         "account_id": account_id,
@@ -107,49 +150,133 @@ def compute_fingerprint(account_id):
         "daily_velocity": daily_velocity,
         "counterparty_weekly": counterparty_weekly,
         "device_count": device_count,
-        "fingerprint_updated_at": datetime.now().isoformat()
+        "fingerprint_updated_at": updated_at or datetime.now().isoformat()
     }
 
+def fingerprint_row(fingerprint):
+    """Fingerprint as written to Neo4j: hour_vector packed into 96 bytes"""
+    row = dict(fingerprint)
+    row["hour_vector_b"] = np.asarray(row.pop("hour_vector"), dtype=HOUR_VECTOR_DTYPE).tobytes()
+    return row
+
+def fingerprint_generation():
+    """Number of fingerprint writes made by this process so far"""
+    return write_generation
+
+def mark_fingerprints_written():
+    """Record a fingerprint write, invalidating cached copies"""
+    global write_generation
+    write_generation += 1
+
 def save_fingerprint(fingerprint):
-    """Write fingerprint back to the Account node in Neo4j"""
-    with driver.session() as session:
-        session.run("""
-            MATCH (a:Account {account_id: $account_id})
-            SET a.hour_vector = $hour_vector,
-                a.amount_mean = $amount_mean,
-                a.amount_std = $amount_std,
-                a.daily_velocity = $daily_velocity,
-                a.counterparty_weekly = $counterparty_weekly,
-                a.device_count = $device_count,
-                a.fingerprint_updated_at = $fingerprint_updated_at
-        """, **fingerprint)
-
-def run_all_accounts():
+    """
+    Write fingerprint back to the Account node in Neo4j.
+    The snapshot now holds a stale copy of this account, so it is dropped
+    and drift scoring reads Neo4j until the next run_all_accounts.
+    """
+    get_driver().execute_query(SAVE_FINGERPRINTS_QUERY, rows=[fingerprint_row(fingerprint)])
+    drop_fingerprint_snapshot()
+    mark_fingerprints_written()
+
+def save_fingerprints(tx, fingerprints):
+    """Write a batch of fingerprints back to their Account nodes in one query"""
+    tx.run(SAVE_FINGERPRINTS_QUERY, rows=[fingerprint_row(fp) for fp in fingerprints])
+    mark_fingerprints_written()
+
+def save_fingerprint_snapshot(fingerprints, path=FINGERPRINT_SNAPSHOT):
+    """Dump fingerprints as column arrays, replacing the previous snapshot atomically"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            account_ids=np.array([fp["account_id"] for fp in fingerprints], dtype=str),
+            hour_vectors=np.array([fp["hour_vector"] for fp in fingerprints],
+                                  dtype=HOUR_VECTOR_DTYPE).reshape(-1, 24),
+            amount_means=np.array([fp["amount_mean"] for fp in fingerprints], dtype=np.float64),
+            amount_stds=np.array([fp["amount_std"] for fp in fingerprints], dtype=np.float64),
+            daily_velocities=np.array([fp["daily_velocity"] for fp in fingerprints], dtype=np.float64),
+            counterparty_weekly=np.array([fp["counterparty_weekly"] for fp in fingerprints], dtype=np.float64),
+            device_counts=np.array([fp["device_count"] for fp in fingerprints], dtype=np.int64)
+        )
+    os.replace(tmp_path, path)
+
+def drop_fingerprint_snapshot(path=FINGERPRINT_SNAPSHOT):
+    """Remove the snapshot, if there is one"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def get_all_account_histories(days=90, cutoff=None):
+    """
+    Fingerprint inputs for every account in three aggregate queries,
+    instead of three queries per account. The queries are independent, so
+    they run concurrently on the driver's connection pool.
+    Returns {account_id: {"transaction_count", "amount_mean", "amount_std",
+                          "hour_counts", "unique_counterparties", "device_count"}}
+    """
+    if cutoff is None:
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+
+    driver = get_driver()
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        transactions = pool.submit(driver.execute_query, ALL_TRANSACTION_STATS_QUERY,
+                                   cutoff=cutoff, routing_=RoutingControl.READ)
+        counterparties = pool.submit(driver.execute_query, ALL_COUNTERPARTY_COUNTS_QUERY,
+                                     cutoff=cutoff, routing_=RoutingControl.READ)
+        devices = pool.submit(driver.execute_query, ALL_DEVICE_COUNTS_QUERY,
+                              routing_=RoutingControl.READ)
+
+        histories = {
+            r["account_id"]: dict(r.data(), unique_counterparties=0, device_count=0)
+            for r in transactions.result().records
+        }
+        for r in counterparties.result().records:
+            histories[r["account_id"]]["unique_counterparties"] = r["unique_counterparties"]
+        for r in devices.result().records:
+            histories[r["account_id"]]["device_count"] = r["device_count"]
+
+    return histories
+
+def run_all_accounts(days=90):
     """Compute and save fingerprints for all accounts"""
-    with driver.session() as session:
-        result = session.run("MATCH (a:Account) RETURN a.account_id as account_id")
-        account_ids = [r["account_id"] for r in result]
+    # One clock reading for the whole batch: same window and timestamp for every account
+    batch_time = datetime.now()
+    updated_at = batch_time.isoformat()
+    histories = get_all_account_histories(days, (batch_time - timedelta(days=days)).isoformat())
 
-    print(f"\n🔍 Computing fingerprints for {len(account_ids)} accounts...\n")
+    print(f"\n🔍 Computing fingerprints for {len(histories)} accounts...\n")
 
-    success = 0
+    weeks = days / 7
+    fingerprints = []
     skipped = 0
 
-    for i, account_id in enumerate(account_ids):
-        fingerprint = compute_fingerprint(account_id)
-        if fingerprint:
-            save_fingerprint(fingerprint)
-            success += 1
-        else:
+    for account_id, h in histories.items():
+        if h["transaction_count"] < 3:
+            # Not enough history to build fingerprint
             skipped += 1
+            continue
+
+        fingerprints.append(build_fingerprint(
+            account_id,
+            transaction_count=h["transaction_count"],
+            amount_mean=h["amount_mean"],
+            amount_std=h["amount_std"],
+            hour_counts=h["hour_counts"],
+            counterparty_weekly=round(h["unique_counterparties"] / weeks, 2),
+            device_count=h["device_count"],
+            days=days,
+            updated_at=updated_at
+        ))
 
-        if (i + 1) % 50 == 0:
-            print(f"   Processed {i + 1}/{len(account_ids)}...")
+    with get_driver().session() as session:
+        session.execute_write(save_fingerprints, fingerprints)
+    save_fingerprint_snapshot(fingerprints)
 
     print(f"\n✅ Fingerprinting complete")
-    print(f"   Computed : {success}")
+    print(f"   Computed : {len(fingerprints)}")
     print(f"   Skipped  : {skipped} (insufficient history)")
 
 if __name__ == "__main__":
     run_all_accounts()
-    driver.close()
\ No newline at end of file
+    close_driver()
\ No newline at end of file
@@ -1,13 +1,5 @@
-from neo4j import GraphDatabase
-from dotenv import load_dotenv
-import os
 import math
-
-load_dotenv("config/.env")
-driver = GraphDatabase.driver(
-    os.getenv("NEO4J_URI"),
-    auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD"))
-)
+from engine._db import get_driver, close_driver
 
 def simulate_recovery(account_id, days=30):
     print(f"\n🔄 Trust Recovery Simulation — {account_id}")
@@ -16,7 +8,7 @@ def simulate_recovery(account_id, days=30):
     print(f"{'Day':<6} {'Contamination':<16} {'Drift':<10} {'Zone':<12}")
     print("-" * 55)
 
-    with driver.session() as session:
+    with get_driver().session() as session:
         result = session.run("""
             MATCH (a:Account {account_id: $id})
             RETURN a.contamination_score as contamination,
@@ -81,4 +73,4 @@ if __name__ == "__main__":
     # Use a known exposed account
     simulate_recovery("ACC00548", days=30)
     simulate_no_recovery("ACC00548", days=30)
-    driver.close()
\ No newline at end of file
+    close_driver()
\ No newline at end of file
@@ -57,17 +57,9 @@ def optimize_weights(accounts):
     return df, best
 
 if __name__ == "__main__":
-    from neo4j import GraphDatabase
-    from dotenv import load_dotenv
-    import os
+    from engine._db import get_driver, close_driver
 
-    load_dotenv("config/.env")
-    driver = GraphDatabase.driver(
-        os.getenv("NEO4J_URI"),
-        auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD"))
-    )
-
-    with driver.session() as session:
+    with get_driver().session() as session:
         result = session.run("""
             MATCH (a:Account)
             RETURN a.account_id as account_id,
@@ -77,5 +69,5 @@ if __name__ == "__main__":
         """)
         accounts = [dict(r) for r in result]
 
-    driver.close()
+    close_driver()
     optimize_weights(accounts)
\ No newline at end of file
@@ -2,14 +2,15 @@ from neo4j import GraphDatabase
 from dotenv import load_dotenv
 import os
 
-load_dotenv("config/.env")
-
-URI = os.getenv("NEO4J_URI")
-USER = os.getenv("NEO4J_USER")
-PASSWORD = os.getenv("NEO4J_PASSWORD")
+# GDS in-memory graph of Account -> Account transaction hops
+TX_GRAPH = "dfcrm_tx"
 
 def get_driver():
-    return GraphDatabase.driver(URI, auth=(USER, PASSWORD))
+    load_dotenv("config/.env")
+    return GraphDatabase.driver(
+        os.getenv("NEO4J_URI"),
+        auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD"))
+    )
 
 def create_constraints(driver):
     with driver.session() as session:
@@ -60,6 +61,29 @@ def create_indexes(driver):
 
         print("✅ Indexes created")
 
+def create_graph_projection(driver):
+    """
+    Project the transaction graph into GDS for /fraud-neighbors.
+    The projection is an in-memory snapshot of the graph at call time:
+    transactions added afterwards are not in it until it is re-projected
+    (the API does this on startup).
+    """
+    with driver.session() as session:
+
+        # Drop any stale projection so it reflects the current graph
+        session.run("CALL gds.graph.drop($name, false) YIELD graphName", name=TX_GRAPH)
+
+        # One undirected relationship per transaction (SENT + RECEIVED collapsed),
+        # OPTIONAL MATCH keeps accounts with no transactions in the projection
+        session.run("""
+            MATCH (s:Account)
+            OPTIONAL MATCH (s)-[:SENT]->(:Transaction)-[:RECEIVED]->(r:Account)
+            WITH gds.graph.project($name, s, r, {}, {undirectedRelationshipTypes: ['*']}) AS g
+            RETURN g.graphName
+        """, name=TX_GRAPH)
+
+        print("✅ Graph projection created")
+
 def verify_connection(driver):
     with driver.session() as session:
         result = session.run("RETURN 'Connection successful' as message")
@@ -1,6 +1,11 @@
-from engine.fingerprint import run_all_accounts, driver as fp_driver
-from engine.contamination import run_full_contamination_pass, driver as cont_driver
+from engine._db import close_driver
+from engine.fingerprint import run_all_accounts
+from engine.contamination import run_full_contamination_pass
 from datetime import datetime
+import atexit
+
+# One shared driver for the whole process, so every step reuses a warm pool
+atexit.register(close_driver)
 
 def run_pipeline():
     print("=" * 50)
@@ -10,11 +15,9 @@ def run_pipeline():
 
     print("\n📌 Step 1: Recompute behavioral fingerprints")
     run_all_accounts()
-    fp_driver.close()
 
     print("\n📌 Step 2: Run contamination + zone classification")
     run_full_contamination_pass()
-    cont_driver.close()
 
     print("\n✅ Pipeline complete. Graph is up to date.")
 